@@ -1,13 +1,36 @@
 import os
+import hashlib
+import shutil
 import sys
+import asyncio
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple
 
-from openai import OpenAI
-from pypdf import PdfReader
+from openai import AsyncOpenAI
 import time
 
+import llm_cache
+import rate_limit
+from pipeline import (
+    CHARS_PER_TOKEN,
+    CHUNK_OVERLAP_TOKENS,
+    chunk_text,
+    read_pdf_text_pdfium,
+    read_pdf_text_pypdf,
+    stream_combine_chunk_summaries_async,
+    stream_summarize_single_async,
+    summarize_chunks_async,
+)
+
+# Next to the response cache rather than inside it, since that directory belongs to diskcache.
+EXTRACT_CACHE_DIR = Path(llm_cache.CACHE_DIR).with_name("pdf-summarizer-text")
+# Part of every cache file name; bump it whenever extraction output changes
+# (backend, page filtering, normalization) so old entries stop matching.
+EXTRACT_CACHE_VERSION = "v1"
+
 
 def ensure_api_key() -> None:
     """
@@ -24,207 +47,158 @@ def ensure_api_key() -> None:
         sys.exit(1)
 
 
-def get_client() -> OpenAI:
-    """
-    Create and return an OpenAI client.
-    Assumes OPENAI_API_KEY is already set.
-    """
-    return OpenAI()
-
-
-def read_pdf_text(pdf_path: Path) -> str:
+def extract_pdf_text(pdf_path: Path) -> str:
     """
-    Read all text from a PDF file.
+    Extract all text from a PDF file.
+    Uses pdfium first and falls back to pypdf if pdfium can't handle the file.
     Returns an empty string if something goes wrong.
     """
     try:
-        reader = PdfReader(str(pdf_path))
-        chunks: List[str] = []
-        for page in reader.pages:
-            text = page.extract_text() or ""
-            if text.strip():
-                chunks.append(text)
-        return "\n\n".join(chunks)
+        return read_pdf_text_pdfium(str(pdf_path))
+    except Exception as e:
+        print(f"  [WARN] pdfium could not read {pdf_path.name} ({e}), falling back to pypdf")
+
+    try:
+        return read_pdf_text_pypdf(str(pdf_path))
     except Exception as e:
         print(f"  [ERROR] Failed to read PDF {pdf_path.name}: {e}")
         return ""
 
 
-def chunk_text(text: str, chunk_size: int = 6000, overlap: int = 500) -> List[str]:
+def read_pdf_text(pdf_path: Path, cache_dir: Optional[Path] = None) -> str:
     """
-    Split a long text into overlapping chunks so we can safely send them to the model.
+    Read all text from a PDF file.
 
-    chunk_size: max characters per chunk
-    overlap:    number of characters to overlap between chunks to preserve context
+    If cache_dir is given, the extracted text is stored there as
+    <sha256 of the PDF>.<EXTRACT_CACHE_VERSION>.txt and reused on later runs, so only
+    the LLM step repeats for an unchanged PDF. Entries are never evicted.
     """
-    if len(text) <= chunk_size:
-        return [text]
-
-    chunks: List[str] = []
-    start = 0
-    end = chunk_size
-
-    while start < len(text):
-        chunk = text[start:end]
-        chunks.append(chunk)
-        # move forward but keep some overlap
-        start = end - overlap
-        end = start + chunk_size
+    cached_path: Optional[Path] = None
+    if cache_dir is not None:
+        try:
+            # hash in 1 MiB blocks rather than loading the whole PDF into memory
+            digest = hashlib.sha256()
+            with open(pdf_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            cached_path = cache_dir / f"{digest.hexdigest()}.{EXTRACT_CACHE_VERSION}.txt"
+            if cached_path.exists():
+                return cached_path.read_text(encoding="utf-8")
+        except OSError as e:
+            print(f"  [WARN] Extraction cache unavailable for {pdf_path.name}: {e}")
+            cached_path = None
+
+    text = extract_pdf_text(pdf_path)
+
+    if cached_path is not None and text:
+        # write then rename, so a half-written file is never picked up as a cache hit;
+        # a failed write only means the next run extracts again
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = cached_path.with_name(f"{cached_path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(text, encoding="utf-8")
+            os.replace(tmp_path, cached_path)
+        except OSError as e:
+            print(f"  [WARN] Could not cache extracted text for {pdf_path.name}: {e}")
 
-    return chunks
+    return text
 
 
-def summarize_chunk(
-    client: OpenAI,
-    chunk: str,
-    model: str,
-    style: str,
-) -> str:
+def read_pdf_text_alone(pdf_path: Path, cache_dir: Optional[Path] = None) -> str:
     """
-    Summarize a single chunk of text.
-    We keep this short because it will be combined later.
+    Run read_pdf_text for one PDF in a fresh worker process of its own.
+    Used after the shared pool broke, so only the PDF whose worker really
+    crashes is lost. Returns an empty string if extraction fails.
     """
-    style_instruction = {
-        "default": "Use a clear, student-friendly tone.",
-        "bullet": "Focus on bullet points only.",
-        "narrative": "Write in a smooth narrative style.",
-        "executive": "Write in an executive-style summary for busy leaders.",
-    }.get(style, "Use a clear, student-friendly tone.")
-
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You are a concise assistant that summarizes educational documents. "
-                    f"{style_instruction}"
-                ),
-            },
-            {
-                "role": "user",
-                "content": (
-                    "Summarize the following part of a document in 5–8 bullet points. "
-                    "Keep it compact but capture all key ideas.\n\n"
-                    f"{chunk[:12000]}"
-                ),
-            },
-        ],
-        temperature=0.2,
-    )
-
-    return response.choices[0].message.content.strip()
+    try:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            return executor.submit(read_pdf_text, pdf_path, cache_dir).result()
+    except Exception as e:
+        print(f"  [ERROR] Failed to read PDF {pdf_path.name}: {e}")
+        return ""
 
 
-def combine_chunk_summaries(
-    client: OpenAI,
-    chunk_summaries: List[str],
-    model: str,
-    style: str,
+async def summarize_document(
+    client: AsyncOpenAI,
+    text: str,
     title: str,
-) -> str:
-    """
-    Combine individual chunk summaries into a single, structured document-level summary.
-    """
-    style_instruction = {
-        "default": "Use a clear, student-friendly tone.",
-        "bullet": "Focus heavily on structured bullet points.",
-        "narrative": "Write in a smooth narrative style.",
-        "executive": "Write an executive-style summary with key risks, insights, and actions.",
-    }.get(style, "Use a clear, student-friendly tone.")
-
-    joined_summaries = "\n\n---\n\n".join(chunk_summaries)
-
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You are an assistant that turns multiple partial summaries into one clear, "
-                    "structured summary a college student can use to study."
-                ),
-            },
-            {
-                "role": "user",
-                "content": (
-                    f"Document title: {title}\n\n"
-                    "You are given partial summaries of different parts of a longer document.\n\n"
-                    "TASK:\n"
-                    "1) Read all the partial summaries.\n"
-                    "2) Produce a single, well-structured summary with this schema:\n"
-                    "   - Title\n"
-                    "   - 5–7 sentence overview\n"
-                    "   - 5–10 bullet key ideas\n"
-                    "   - Optional: 3–5 action items or next steps\n\n"
-                    f"Write in this style: {style_instruction}\n\n"
-                    "Here are the partial summaries:\n\n"
-                    f"{joined_summaries[:24000]}"
-                ),
-            },
-        ],
-        temperature=0.25,
-    )
-
-    return response.choices[0].message.content.strip()
-
-
-def summarize_document(
-    client: OpenAI,
-    pdf_path: Path,
-    model: str,
+    chunk_model: str,
+    combine_model: str,
     style: str,
-    max_chars_per_chunk: int,
-) -> str:
+    max_tokens_per_chunk: int,
+    sem: asyncio.Semaphore,
+    chunks_per_batch: int = 6,
+    checkpoint_dir: Optional[Path] = None,
+) -> AsyncIterator[str]:
     """
-    Full pipeline for a single PDF:
-    - Read text
+    Full pipeline for a single PDF's extracted text:
     - Chunk if needed
     - Summarize each chunk
-    - Combine into final summary (Markdown)
+    - Combine into final summary (Markdown), a few summaries at a time
+
+    The final summary is yielded piece by piece as the model streams it.
+    Chunk summaries are checkpointed to checkpoint_dir, if given, so a re-run
+    after a crash only pays for the chunks that were not finished.
+    Every request holds sem, which is shared by all documents being summarized.
     """
-    text = read_pdf_text(pdf_path)
-    if not text.strip():
+    if not text or text.isspace():
         raise ValueError("No text extracted from PDF.")
 
-    chunks = chunk_text(text, chunk_size=max_chars_per_chunk, overlap=500)
+    # tokenizing a long document takes a while; keep the event loop free for other PDFs
+    chunks = await asyncio.to_thread(
+        chunk_text, text, model=chunk_model, chunk_tokens=max_tokens_per_chunk
+    )
 
     if len(chunks) == 1:
-        # simple case: one call
-        single_summary = combine_chunk_summaries(
-            client=client,
-            chunk_summaries=[chunks[0]],
-            model=model,
-            style=style,
-            title=pdf_path.stem,
-        )
-        return single_summary
-
-    # multi-chunk: summarize each chunk then combine
-    chunk_summaries: List[str] = []
-    for idx, chunk in enumerate(chunks, start=1):
-        print(f"    Summarizing chunk {idx}/{len(chunks)}...")
-        summary = summarize_chunk(client=client, chunk=chunk, model=model, style=style)
-        chunk_summaries.append(summary)
+        # simple case: summarize the whole text in one call
+        async with sem:
+            async for delta in stream_summarize_single_async(
+                client=client,
+                text=chunks[0],
+                model=combine_model,
+                style=style,
+                title=title,
+            ):
+                yield delta
+        return
 
-    final_summary = combine_chunk_summaries(
+    # multi-chunk: summarize all chunks concurrently then tree-combine
+    print(f"    [{title}] Summarizing {len(chunks)} chunks ({chunks_per_batch} per request)...")
+    final_inputs = await summarize_chunks_async(
         client=client,
-        chunk_summaries=chunk_summaries,
-        model=model,
+        chunks=chunks,
+        chunk_model=chunk_model,
+        combine_model=combine_model,
         style=style,
-        title=pdf_path.stem,
+        title=title,
+        sem=sem,
+        chunks_per_batch=chunks_per_batch,
+        checkpoint_dir=checkpoint_dir,
     )
 
-    return final_summary
+    async with sem:
+        async for delta in stream_combine_chunk_summaries_async(
+            client=client,
+            chunk_summaries=final_inputs,
+            model=combine_model,
+            style=style,
+            title=title,
+        ):
+            yield delta
 
 
 def process_pdfs(
     input_folder: Path,
     output_folder: Path,
-    model: str,
+    chunk_model: str,
+    combine_model: str,
     style: str,
-    max_chars_per_chunk: int,
+    max_tokens_per_chunk: int,
     force: bool,
+    max_concurrency: int = 8,
+    chunks_per_batch: int = 6,
+    extract_cache: bool = True,
+    max_parallel_pdfs: int = 4,
 ) -> None:
     """
     Main loop:
@@ -243,32 +217,110 @@ def process_pdfs(
 
     print(f"Found {len(pdf_files)} PDF(s) in {input_folder.resolve()}")
     ensure_api_key()
-    client = get_client()
 
+    # (position in pdf_files, path), so progress lines all count against len(pdf_files)
+    pending: List[Tuple[int, Path]] = []
     for idx, pdf_path in enumerate(pdf_files, start=1):
         output_path = output_folder / f"{pdf_path.stem}.summary.md"
-
-        print(f"\n[{idx}/{len(pdf_files)}] Processing {pdf_path.name}...")
-
         if output_path.exists() and not force:
-            print(f"  Skipping (summary already exists at {output_path.name}). Use --force to regenerate.")
+            print(
+                f"\n[{idx}/{len(pdf_files)}] Skipping {pdf_path.name} "
+                f"(summary already exists at {output_path.name}). Use --force to regenerate."
+            )
             continue
+        pending.append((idx, pdf_path))
+
+    if not pending:
+        return
+
+    cache_dir = EXTRACT_CACHE_DIR if extract_cache else None
 
+    async def summarize_one(
+        client: AsyncOpenAI,
+        sem: asyncio.Semaphore,
+        pdf_slots: asyncio.Semaphore,
+        idx: int,
+        pdf_path: Path,
+        extraction: asyncio.Future,
+    ) -> None:
         try:
-            summary = summarize_document(
-                client=client,
-                pdf_path=pdf_path,
-                model=model,
-                style=style,
-                max_chars_per_chunk=max_chars_per_chunk,
-            )
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(f"# Summary for {pdf_path.name}\n\n")
-                f.write(summary)
-            print(f"  ✅ Summary saved to {output_path}")
+            text = await extraction
+        except BrokenProcessPool:
+            # A worker died hard (e.g. pdfium crashing on a malformed PDF) and took the
+            # pool down with it; every unfinished PDF ends up here, so retry each alone.
+            text = await asyncio.to_thread(read_pdf_text_alone, pdf_path, cache_dir)
         except Exception as e:
-            print(f"  [ERROR] Failed to summarize {pdf_path.name}: {e}")
-            # continue with next file
+            print(f"  [ERROR] Failed to read PDF {pdf_path.name}: {e}")
+            text = ""
+
+        async with pdf_slots:
+            output_path = output_folder / f"{pdf_path.stem}.summary.md"
+
+            print(f"\n[{idx}/{len(pdf_files)}] Processing {pdf_path.name}...")
+
+            # checked here, before the .partial file is created, so scanned or unreadable
+            # PDFs don't leave a header-only .partial behind on every pass
+            if not text or text.isspace():
+                print(f"  [ERROR] Failed to summarize {pdf_path.name}: No text extracted from PDF.")
+                return
+
+            # Stream into a .partial file so a crash keeps what was generated,
+            # and only move it into place once the summary is complete.
+            partial_path = output_path.with_name(output_path.name + ".partial")
+            checkpoint_dir = output_folder / ".checkpoints" / pdf_path.stem
+            try:
+                with open(partial_path, "w", encoding="utf-8") as f:
+                    f.write(f"# Summary for {pdf_path.name}\n\n")
+                    async for delta in summarize_document(
+                        client=client,
+                        text=text,
+                        title=pdf_path.stem,
+                        chunk_model=chunk_model,
+                        combine_model=combine_model,
+                        style=style,
+                        max_tokens_per_chunk=max_tokens_per_chunk,
+                        sem=sem,
+                        chunks_per_batch=chunks_per_batch,
+                        checkpoint_dir=checkpoint_dir,
+                    ):
+                        f.write(delta)
+                        f.flush()
+                os.replace(partial_path, output_path)
+                shutil.rmtree(checkpoint_dir, ignore_errors=True)
+                print(f"  ✅ Summary saved to {output_path}")
+            except Exception as e:
+                print(f"  [ERROR] Failed to summarize {pdf_path.name}: {e}")
+                # continue with next file
+
+    async def _run() -> None:
+        # Every PDF runs on this one event loop with one client and one semaphore, so
+        # --max-concurrency caps the requests in flight across all PDFs. Text is
+        # extracted in parallel worker processes, and each PDF starts summarizing as
+        # soon as its own extraction finishes; a folder of short single-chunk PDFs
+        # would otherwise make one request at a time.
+        loop = asyncio.get_running_loop()
+        sem = asyncio.Semaphore(max_concurrency)
+        pdf_slots = asyncio.Semaphore(max_parallel_pdfs)
+        executor = ProcessPoolExecutor(max_workers=min(len(pending), os.cpu_count() or 1))
+        try:
+            async with AsyncOpenAI(max_retries=0) as client:
+                await asyncio.gather(*[
+                    summarize_one(
+                        client,
+                        sem,
+                        pdf_slots,
+                        idx,
+                        pdf_path,
+                        loop.run_in_executor(executor, read_pdf_text, pdf_path, cache_dir),
+                    )
+                    for idx, pdf_path in pending
+                ])
+        finally:
+            # On Ctrl-C asyncio.run cancels this task; drop the extractions still queued
+            # instead of waiting for every one of them (a normal run has none left).
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    asyncio.run(_run())
 
 
 def parse_args() -> argparse.Namespace:
@@ -291,10 +343,22 @@ def parse_args() -> argparse.Namespace:
         help="Folder to write Markdown summaries to (default: summaries)",
     )
     parser.add_argument(
-        "--model",
+        "--chunk-model",
+        type=str,
+        default="gpt-4.1-nano",
+        help="OpenAI model for the per-chunk bullet summaries (default: gpt-4.1-nano)",
+    )
+    parser.add_argument(
+        "--combine-model",
         type=str,
         default="gpt-4.1-mini",
-        help="OpenAI model to use (default: gpt-4.1-mini)",
+        help="OpenAI model for combining into the final summary (default: gpt-4.1-mini)",
+    )
+    parser.add_argument(
+        "--model",
+        type=str,
+        default=None,
+        help="Deprecated: sets both --chunk-model and --combine-model",
     )
     parser.add_argument(
         "--style",
@@ -303,22 +367,87 @@ def parse_args() -> argparse.Namespace:
         choices=["default", "bullet", "narrative", "executive"],
         help="Summary style (default, bullet, narrative, executive)",
     )
+    parser.add_argument(
+        "--max-tokens-per-chunk",
+        type=int,
+        default=3000,
+        help="Maximum tokens per chunk when splitting large PDFs (default: 3000)",
+    )
     parser.add_argument(
         "--max-chars-per-chunk",
         type=int,
-        default=6000,
-        help="Maximum characters per chunk when splitting large PDFs (default: 6000)",
+        default=None,
+        help=(
+            "Deprecated: converted to --max-tokens-per-chunk "
+            f"at about {CHARS_PER_TOKEN} characters per token"
+        ),
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=8,
+        help="Maximum number of OpenAI requests in flight at once, across all PDFs (default: 8)",
+    )
+    parser.add_argument(
+        "--max-parallel-pdfs",
+        type=int,
+        default=4,
+        help="Number of PDFs summarized at the same time (default: 4)",
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=float,
+        default=500,
+        help="Maximum OpenAI requests per minute across all workers (default: 500)",
+    )
+    parser.add_argument(
+        "--chunks-per-batch",
+        type=int,
+        default=6,
+        help="Number of chunks summarized together in one request (default: 6)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call the API instead of reusing cached responses from ~/.cache/pdf-summarizer.",
+    )
+    parser.add_argument(
+        "--no-extract-cache",
+        action="store_true",
+        help="Always re-extract PDF text instead of reusing text cached by file hash.",
     )
     parser.add_argument(
         "--force",
         action="store_true",
         help="Regenerate summaries even if they already exist.",
     )
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.model is not None:
+        print("[WARN] --model is deprecated, use --chunk-model and --combine-model")
+        args.chunk_model = args.combine_model = args.model
+    if args.max_chars_per_chunk is not None:
+        if args.max_chars_per_chunk <= CHUNK_OVERLAP_TOKENS * CHARS_PER_TOKEN:
+            parser.error(
+                f"--max-chars-per-chunk must be greater than {CHUNK_OVERLAP_TOKENS * CHARS_PER_TOKEN}"
+            )
+        args.max_tokens_per_chunk = args.max_chars_per_chunk // CHARS_PER_TOKEN
+        print(
+            "[WARN] --max-chars-per-chunk is deprecated, use --max-tokens-per-chunk "
+            f"(using {args.max_tokens_per_chunk} tokens)"
+        )
+    if args.max_tokens_per_chunk <= CHUNK_OVERLAP_TOKENS:
+        parser.error(f"--max-tokens-per-chunk must be greater than {CHUNK_OVERLAP_TOKENS}")
+    for flag in ("max_concurrency", "max_parallel_pdfs", "chunks_per_batch", "requests_per_minute"):
+        if getattr(args, flag) <= 0:
+            parser.error(f"--{flag.replace('_', '-')} must be greater than 0")
+    return args
 
 
 def main() -> None:
     args = parse_args()
+    if args.no_cache:
+        llm_cache.disable()
+    rate_limit.set_requests_per_minute(args.requests_per_minute)
 
     input_folder = Path(args.input_folder)
     output_folder = Path(args.output_folder)
@@ -327,10 +456,15 @@ def main() -> None:
         process_pdfs(
             input_folder=input_folder,
             output_folder=output_folder,
-            model=args.model,
+            chunk_model=args.chunk_model,
+            combine_model=args.combine_model,
             style=args.style,
-            max_chars_per_chunk=args.max_chars_per_chunk,
+            max_tokens_per_chunk=args.max_tokens_per_chunk,
             force=args.force,
+            max_concurrency=args.max_concurrency,
+            chunks_per_batch=args.chunks_per_batch,
+            extract_cache=not args.no_extract_cache,
+            max_parallel_pdfs=args.max_parallel_pdfs,
         )
         print("Agent sleeping for 10 seconds before checking again...")
         time.sleep(10)
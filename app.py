@@ -1,5 +1,9 @@
+import asyncio
+
 import streamlit as st
-from summarizer import summarize_pdf_bytes
+from openai import AsyncOpenAI
+
+from summarizer import summarize_pdf_bytes_async, summarize_pdf_bytes_stream
 
 st.title("PDF Agent Summarizer (MVP)")
 
@@ -17,37 +21,82 @@ style = st.selectbox(
     index=0,
 )
 
-model = st.text_input("OpenAI model", value="gpt-4.1-mini")
+chunk_model = st.text_input("OpenAI model for chunk summaries", value="gpt-4.1-nano")
+combine_model = st.text_input("OpenAI model for the final summary", value="gpt-4.1-mini")
 
-max_chars = st.number_input(
-    "Max characters per chunk",
-    min_value=1000,
-    max_value=12000,
-    value=6000,
-    step=500,
+max_tokens = st.number_input(
+    "Max tokens per chunk",
+    min_value=500,
+    max_value=8000,
+    value=3000,
+    step=250,
 )
 
-if st.button("Summarize") and uploaded_files:
-    for uploaded_file in uploaded_files:
-        with st.spinner(f"Summarizing {uploaded_file.name}..."):
-            pdf_bytes = uploaded_file.read()
+
+def show_download(name: str, summary: str) -> None:
+    st.download_button(
+        label=f"Download {name}.summary.md",
+        data=summary,
+        file_name=f"{name}.summary.md",
+        mime="text/markdown",
+    )
+
+
+async def summarize_uploads(files) -> None:
+    # All files share one client and one request limit; each result is shown as soon as it's ready.
+    sem = asyncio.Semaphore(32)
+    async with AsyncOpenAI(max_retries=0) as client:
+
+        async def one(name: str, pdf_bytes: bytes):
             try:
-                summary = summarize_pdf_bytes(
+                summary = await summarize_pdf_bytes_async(
+                    client=client,
                     pdf_bytes=pdf_bytes,
-                    filename=uploaded_file.name,
-                    model=model,
+                    filename=name,
+                    sem=sem,
+                    chunk_model=chunk_model,
+                    combine_model=combine_model,
                     style=style,
-                    max_chars_per_chunk=max_chars,
+                    max_tokens_per_chunk=max_tokens,
                 )
-                st.success(f"Done: {uploaded_file.name}")
-                st.markdown(f"### Summary: {uploaded_file.name}")
-                st.markdown(summary)
+                return name, summary, None
+            except Exception as e:
+                return name, None, e
+
+        tasks = [one(uploaded_file.name, uploaded_file.read()) for uploaded_file in files]
+        for next_done in asyncio.as_completed(tasks):
+            name, summary, error = await next_done
+            if error is not None:
+                st.error(f"Error with {name}: {error}")
+                continue
+            st.success(f"Done: {name}")
+            st.markdown(f"### Summary: {name}")
+            st.markdown(summary)
+            show_download(name, summary)
 
-                st.download_button(
-                    label=f"Download {uploaded_file.name}.summary.md",
-                    data=summary,
-                    file_name=f"{uploaded_file.name}.summary.md",
-                    mime="text/markdown",
+
+if st.button("Summarize") and uploaded_files:
+    if len(uploaded_files) == 1:
+        # a single file streams its summary onto the page as it's written
+        uploaded_file = uploaded_files[0]
+        with st.spinner(f"Summarizing {uploaded_file.name}..."):
+            pdf_bytes = uploaded_file.read()
+            try:
+                st.markdown(f"### Summary: {uploaded_file.name}")
+                summary = st.write_stream(
+                    summarize_pdf_bytes_stream(
+                        pdf_bytes=pdf_bytes,
+                        filename=uploaded_file.name,
+                        chunk_model=chunk_model,
+                        combine_model=combine_model,
+                        style=style,
+                        max_tokens_per_chunk=max_tokens,
+                    )
                 )
+                st.success(f"Done: {uploaded_file.name}")
+                show_download(uploaded_file.name, summary)
             except Exception as e:
                 st.error(f"Error with {uploaded_file.name}: {e}")
+    else:
+        with st.spinner(f"Summarizing {len(uploaded_files)} PDFs..."):
+            asyncio.run(summarize_uploads(uploaded_files))
@@ -0,0 +1,65 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional
+
+from diskcache import Cache
+
+CACHE_DIR = os.path.expanduser("~/.cache/pdf-summarizer")
+
+_cache: Optional[Cache] = None
+_enabled = True
+
+
+def disable() -> None:
+    """
+    Turn the cache off for this process (used by --no-cache).
+    """
+    global _enabled
+    _enabled = False
+
+
+def _get_cache() -> Cache:
+    global _cache
+    if _cache is None:
+        _cache = Cache(CACHE_DIR)
+    return _cache
+
+
+def cache_key(
+    model: str,
+    style: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+) -> str:
+    """
+    Build a stable key for a chat request from everything that affects its output.
+    """
+    payload = json.dumps(
+        {
+            "model": model,
+            "style": style,
+            "messages": messages,
+            "temperature": temperature,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(key: str) -> Optional[str]:
+    """
+    Return the cached response for key, or None on a miss (or when disabled).
+    """
+    if not _enabled:
+        return None
+    return _get_cache().get(key)
+
+
+def set(key: str, value: str) -> None:
+    """
+    Store a response under key. Does nothing when the cache is disabled.
+    """
+    if not _enabled:
+        return
+    _get_cache().set(key, value)
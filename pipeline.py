@@ -0,0 +1,764 @@
+"""
+Prompt, chunking and summarization code shared by the CLI (agent_pdf_summarizer.py)
+and the Streamlit app (summarizer.py), so both send byte-identical requests and
+share one response cache.
+"""
+import io
+import os
+import re
+import json
+import hashlib
+import shutil
+import asyncio
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from openai import AsyncOpenAI, BadRequestError, OpenAI
+import pypdfium2 as pdfium
+from pypdf import PdfReader
+import tiktoken
+
+import llm_cache
+import rate_limit
+
+# System prompts are fixed strings and always the first message, so every request
+# of a kind shares an identical prefix that OpenAI's prompt cache can reuse.
+# Anything that varies (style, title, text) goes in the user message.
+CHUNK_SYSTEM_PROMPT = "You are a concise assistant that summarizes educational documents."
+SUMMARY_SYSTEM_PROMPT = (
+    "You are an assistant that turns documents into clear, structured "
+    "summaries a college student can use to study."
+)
+COMBINE_SYSTEM_PROMPT = (
+    "You are an assistant that turns multiple partial summaries into one clear, "
+    "structured summary a college student can use to study."
+)
+
+
+
+def read_pdf_text_pdfium(source) -> str:
+    """
+    Extract text with pdfium (C library), which is much faster than pypdf.
+    Its text page only walks text objects, so graphics-heavy pages (plots, figures)
+    cost little, unlike pypdf which tokenizes every operator in the content stream.
+    Each page is closed as soon as its text is read, to keep memory flat on long books.
+    source can be a path or the raw PDF bytes. Raises if pdfium can't parse it.
+    """
+    pdf = pdfium.PdfDocument(source)
+    try:
+        buf = io.StringIO()
+        for i in range(len(pdf)):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            text = textpage.get_text_range().replace("\r\n", "\n")
+            textpage.close()
+            page.close()
+            if text and not text.isspace():
+                if buf.tell():
+                    buf.write("\n\n")
+                buf.write(text)
+        return buf.getvalue()
+    finally:
+        pdf.close()
+
+
+def page_has_fonts(page) -> bool:
+    """
+    Cheap check for whether a pypdf page can contain any text at all.
+    Text needs a font, either in the page's own /Resources or inside a Form
+    XObject it draws, so scanned/image-only pages can be skipped without
+    parsing their content stream.
+    """
+    resources = page.get("/Resources")
+    if resources is None:
+        return False
+    resources = resources.get_object()
+    if resources.get("/Font"):
+        return True
+    xobjects = resources.get("/XObject")
+    if xobjects:
+        for xobject in xobjects.get_object().values():
+            if xobject.get_object().get("/Subtype") == "/Form":
+                return True
+    return False
+
+
+def read_pdf_text_pypdf(source) -> str:
+    """
+    Extract text with pypdf, for PDFs pdfium can't parse.
+    Pages without fonts (scans, figures) are skipped without parsing their content stream.
+    source can be a path or a binary file object. Raises if pypdf can't parse it.
+    """
+    reader = PdfReader(source)
+    buf = io.StringIO()
+    for page in reader.pages:
+        if not page_has_fonts(page):
+            continue
+        text = page.extract_text() or ""
+        if text and not text.isspace():
+            if buf.tell():
+                buf.write("\n\n")
+            buf.write(text)
+    return buf.getvalue()
+
+
+# Tokens shared by consecutive windows when a paragraph is too long for one chunk.
+CHUNK_OVERLAP_TOKENS = 200
+# Rough ratio for English text, used to convert the old character-based chunk size.
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """
+    Return the tokenizer for model, falling back to o200k_base for models tiktoken doesn't know.
+    Cached, since loading an encoding is slow the first time.
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def split_by_tokens(
+    enc: tiktoken.Encoding,
+    text: str,
+    chunk_tokens: int,
+    overlap_tokens: int,
+) -> List[str]:
+    """
+    Sliding-window split on token ids, for text with no usable paragraph breaks.
+    """
+    ids = enc.encode(text, disallowed_special=())
+    # Window starts move forward by chunk_tokens - overlap_tokens; stopping at
+    # len(ids) - overlap_tokens means the last window ends exactly at the text's end.
+    starts = range(0, max(len(ids) - overlap_tokens, 1), chunk_tokens - overlap_tokens)
+    # A window edge can fall inside a multi-byte character; drop those partial bytes
+    # instead of letting them decode to U+FFFD.
+    return [
+        enc.decode_bytes(ids[start:start + chunk_tokens]).decode("utf-8", errors="ignore")
+        for start in starts
+    ]
+
+
+def chunk_text(
+    text: str,
+    model: str,
+    chunk_tokens: int = 3000,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> List[str]:
+    """
+    Split a long text into chunks so we can safely send them to the model.
+
+    Whole paragraphs are packed greedily into chunks of up to chunk_tokens, so chunks
+    break on clean boundaries and need no overlap. Only a paragraph that is larger than
+    chunk_tokens on its own is cut with a sliding window of overlap_tokens, so
+    chunk_tokens must be larger than overlap_tokens.
+    """
+    if chunk_tokens <= overlap_tokens:
+        raise ValueError(
+            f"chunk_tokens ({chunk_tokens}) must be larger than overlap_tokens ({overlap_tokens})"
+        )
+    enc = get_encoding(model)
+    sep_tokens = len(enc.encode("\n\n"))
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for paragraph in re.split(r"\n\s*\n", text):
+        if not paragraph or paragraph.isspace():
+            continue
+        n_tokens = len(enc.encode(paragraph, disallowed_special=()))
+
+        if current and current_tokens + sep_tokens + n_tokens > chunk_tokens:
+            chunks.append("\n\n".join(current))
+            current = []
+            current_tokens = 0
+
+        if n_tokens > chunk_tokens:
+            chunks.extend(split_by_tokens(enc, paragraph, chunk_tokens, overlap_tokens))
+            continue
+
+        if current:
+            current_tokens += sep_tokens
+        current.append(paragraph)
+        current_tokens += n_tokens
+
+    if current:
+        chunks.append("\n\n".join(current))
+
+    return chunks
+
+
+DEFAULT_STYLE_INSTRUCTION = "Use a clear, student-friendly tone."
+
+# Style wording for the short per-chunk summaries.
+CHUNK_STYLE_INSTRUCTIONS = {
+    "default": DEFAULT_STYLE_INSTRUCTION,
+    "bullet": "Focus on bullet points only.",
+    "narrative": "Write in a smooth narrative style.",
+    "executive": "Write in an executive-style summary for busy leaders.",
+}
+
+# Style wording for the structured document-level summary (single pass or combine).
+SUMMARY_STYLE_INSTRUCTIONS = {
+    "default": DEFAULT_STYLE_INSTRUCTION,
+    "bullet": "Focus heavily on structured bullet points.",
+    "narrative": "Write in a smooth narrative style.",
+    "executive": "Write an executive-style summary with key risks, insights, and actions.",
+}
+
+
+def chunk_messages(chunk: str, style: str) -> List[Dict[str, str]]:
+    """
+    Build the messages for summarizing a single chunk of text.
+    We keep this short because it will be combined later.
+    """
+    style_instruction = CHUNK_STYLE_INSTRUCTIONS.get(style, DEFAULT_STYLE_INSTRUCTION)
+    return [
+        {"role": "system", "content": CHUNK_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": (
+                "Summarize the following part of a document in 5–8 bullet points. "
+                "Keep it compact but capture all key ideas. "
+                f"{style_instruction}\n\n"
+                f"{chunk}"
+            ),
+        },
+    ]
+
+
+def chunk_batch_messages(chunks: List[str], style: str) -> List[Dict[str, str]]:
+    """
+    Build the messages for summarizing several chunks in one request.
+    Each chunk is labeled <<CHUNK n>> (1-based) so the reply can refer to it by id.
+    """
+    style_instruction = CHUNK_STYLE_INSTRUCTIONS.get(style, DEFAULT_STYLE_INSTRUCTION)
+    labeled_chunks = "\n\n".join(
+        f"<<CHUNK {idx}>>\n{chunk}" for idx, chunk in enumerate(chunks, start=1)
+    )
+    return [
+        {"role": "system", "content": CHUNK_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": (
+                f"Below are {len(chunks)} parts of a document, each starting with <<CHUNK n>>. "
+                "Summarize each part separately in 5–8 bullet points. "
+                "Keep it compact but capture all key ideas. "
+                "Return one entry per chunk, with id set to the chunk number. "
+                f"{style_instruction}\n\n"
+                f"{labeled_chunks}"
+            ),
+        },
+    ]
+
+
+def single_summary_messages(text: str, style: str, title: str) -> List[Dict[str, str]]:
+    """
+    Build the messages for summarizing a document that fits in a single chunk.
+    """
+    style_instruction = SUMMARY_STYLE_INSTRUCTIONS.get(style, DEFAULT_STYLE_INSTRUCTION)
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": (
+                "Summarize the document below with this schema:\n"
+                "   - Title\n"
+                "   - 5–7 sentence overview\n"
+                "   - 5–10 bullet key ideas\n"
+                "   - Optional: 3–5 action items or next steps\n\n"
+                f"Write in this style: {style_instruction}\n\n"
+                f"Document title: {title}\n\n"
+                "Here is the document:\n\n"
+                f"{text}"
+            ),
+        },
+    ]
+
+
+def combine_messages(chunk_summaries: List[str], style: str, title: str) -> List[Dict[str, str]]:
+    """
+    Build the messages for combining partial summaries into one structured summary.
+    """
+    style_instruction = SUMMARY_STYLE_INSTRUCTIONS.get(style, DEFAULT_STYLE_INSTRUCTION)
+    joined_summaries = "\n\n---\n\n".join(chunk_summaries)
+    return [
+        {"role": "system", "content": COMBINE_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": (
+                "You are given partial summaries of different parts of a longer document.\n\n"
+                "TASK:\n"
+                "1) Read all the partial summaries.\n"
+                "2) Produce a single, well-structured summary with this schema:\n"
+                "   - Title\n"
+                "   - 5–7 sentence overview\n"
+                "   - 5–10 bullet key ideas\n"
+                "   - Optional: 3–5 action items or next steps\n\n"
+                f"Write in this style: {style_instruction}\n\n"
+                f"Document title: {title}\n\n"
+                "Here are the partial summaries:\n\n"
+                f"{joined_summaries}"
+            ),
+        },
+    ]
+
+
+async def complete_async(
+    client: AsyncOpenAI,
+    model: str,
+    style: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+) -> str:
+    """
+    Run a (non-streaming) chat completion and return its text.
+    A cached response is returned without calling the API; a new one is cached.
+    """
+    key = llm_cache.cache_key(model, style, messages, temperature)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = await rate_limit.create_chat_completion_async(
+        client,
+        model=model,
+        messages=messages,
+        temperature=temperature,
+    )
+
+    summary = response.choices[0].message.content.strip()
+    llm_cache.set(key, summary)
+    return summary
+
+
+async def summarize_chunk_async(
+    client: AsyncOpenAI,
+    chunk: str,
+    model: str,
+    style: str,
+) -> str:
+    """
+    Summarize a single chunk of text.
+    Async, so many chunks can be in flight at once.
+    """
+    return await complete_async(client, model, style, chunk_messages(chunk, style), 0.2)
+
+
+CHUNK_BATCH_SCHEMA = {
+    "name": "chunk_summaries",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "summaries": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "integer"},
+                        "summary": {"type": "string"},
+                    },
+                    "required": ["id", "summary"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["summaries"],
+        "additionalProperties": False,
+    },
+}
+
+
+async def summarize_chunk_batch(
+    client: AsyncOpenAI,
+    chunks: List[str],
+    model: str,
+    style: str,
+) -> List[Optional[str]]:
+    """
+    Summarize several chunks in one request, to save a round-trip per chunk.
+    The model returns a JSON list of {id, summary}; any chunk it leaves out comes
+    back as None, for the caller to summarize on its own with summarize_chunk_async.
+    """
+    if len(chunks) == 1:
+        return [await summarize_chunk_async(client=client, chunk=chunks[0], model=model, style=style)]
+
+    messages = chunk_batch_messages(chunks, style)
+    key = llm_cache.cache_key(model, style, messages, 0.2)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    try:
+        response = await rate_limit.create_chat_completion_async(
+            client,
+            model=model,
+            messages=messages,
+            temperature=0.2,
+            response_format={"type": "json_schema", "json_schema": CHUNK_BATCH_SCHEMA},
+        )
+    except BadRequestError as e:
+        # e.g. a model without structured outputs, or a batch over the context window;
+        # not cached, since it may be a setting that gets fixed
+        print(f"    [WARN] Batched request rejected ({e}), summarizing chunks separately")
+        return [None] * len(chunks)
+
+    try:
+        items = json.loads(response.choices[0].message.content)["summaries"]
+        by_id = {item["id"]: item["summary"].strip() for item in items}
+    except (TypeError, ValueError, KeyError) as e:
+        print(f"    [WARN] Could not parse batched summaries ({e}), summarizing chunks separately")
+        by_id = {}
+
+    summaries = [by_id.get(idx) or None for idx in range(1, len(chunks) + 1)]
+    llm_cache.set(key, json.dumps(summaries))
+    return summaries
+
+
+async def stream_chat_async(
+    client: AsyncOpenAI,
+    model: str,
+    style: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+) -> AsyncIterator[str]:
+    """
+    Run a streaming chat completion and yield the text as it arrives.
+    A cached response is yielded in one piece; a finished stream is cached.
+    """
+    key = llm_cache.cache_key(model, style, messages, temperature)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    stream = await rate_limit.create_chat_completion_async(
+        client,
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        stream=True,
+    )
+
+    parts: List[str] = []
+    async for event in stream:
+        if not event.choices:
+            continue
+        delta = event.choices[0].delta.content or ""
+        if delta:
+            parts.append(delta)
+            yield delta
+
+    llm_cache.set(key, "".join(parts).strip())
+
+
+def stream_chat(
+    client: OpenAI,
+    model: str,
+    style: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+) -> Iterator[str]:
+    """
+    Blocking version of stream_chat_async, for callers without an event loop.
+    """
+    key = llm_cache.cache_key(model, style, messages, temperature)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    stream = rate_limit.create_chat_completion(
+        client,
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        stream=True,
+    )
+
+    parts: List[str] = []
+    for event in stream:
+        if not event.choices:
+            continue
+        delta = event.choices[0].delta.content or ""
+        if delta:
+            parts.append(delta)
+            yield delta
+
+    llm_cache.set(key, "".join(parts).strip())
+
+
+async def stream_summarize_single_async(
+    client: AsyncOpenAI,
+    text: str,
+    model: str,
+    style: str,
+    title: str,
+) -> AsyncIterator[str]:
+    """
+    Summarize a document that fits in a single chunk in one pass,
+    yielding the text as the model generates it.
+    """
+    messages = single_summary_messages(text, style, title)
+    async for delta in stream_chat_async(client, model, style, messages, 0.25):
+        yield delta
+
+
+def stream_summarize_single(
+    client: OpenAI,
+    text: str,
+    model: str,
+    style: str,
+    title: str,
+) -> Iterator[str]:
+    """
+    Blocking version of stream_summarize_single_async.
+    """
+    messages = single_summary_messages(text, style, title)
+    yield from stream_chat(client, model, style, messages, 0.25)
+
+
+async def summarize_single_async(
+    client: AsyncOpenAI,
+    text: str,
+    model: str,
+    style: str,
+    title: str,
+) -> str:
+    """
+    Non-streaming version of stream_summarize_single_async.
+    """
+    messages = single_summary_messages(text, style, title)
+    return await complete_async(client, model, style, messages, 0.25)
+
+
+async def stream_combine_chunk_summaries_async(
+    client: AsyncOpenAI,
+    chunk_summaries: List[str],
+    model: str,
+    style: str,
+    title: str,
+) -> AsyncIterator[str]:
+    """
+    Combine individual chunk summaries into a single, structured document-level summary,
+    yielding the text as the model generates it.
+    """
+    messages = combine_messages(chunk_summaries, style, title)
+    async for delta in stream_chat_async(client, model, style, messages, 0.25):
+        yield delta
+
+
+def stream_combine_chunk_summaries(
+    client: OpenAI,
+    chunk_summaries: List[str],
+    model: str,
+    style: str,
+    title: str,
+) -> Iterator[str]:
+    """
+    Blocking version of stream_combine_chunk_summaries_async.
+    """
+    messages = combine_messages(chunk_summaries, style, title)
+    yield from stream_chat(client, model, style, messages, 0.25)
+
+
+async def combine_chunk_summaries_async(
+    client: AsyncOpenAI,
+    chunk_summaries: List[str],
+    model: str,
+    style: str,
+    title: str,
+) -> str:
+    """
+    Non-streaming async version of stream_combine_chunk_summaries,
+    used for the levels of tree_combine.
+    """
+    messages = combine_messages(chunk_summaries, style, title)
+    return await complete_async(client, model, style, messages, 0.25)
+
+
+COMBINE_GROUP_SIZE = 4
+
+
+async def tree_combine(
+    client: AsyncOpenAI,
+    summaries: List[str],
+    model: str,
+    style: str,
+    title: str,
+    sem: asyncio.Semaphore,
+) -> List[str]:
+    """
+    Combine summaries in groups of COMBINE_GROUP_SIZE, level by level, until a single
+    group is left for the final (streamed) combine.
+    Every call only sees a handful of summaries, so nothing has to be truncated,
+    and all groups on a level run in parallel.
+    """
+
+    async def one(group: List[str]) -> str:
+        if len(group) == 1:
+            return group[0]
+        async with sem:
+            return await combine_chunk_summaries_async(
+                client=client,
+                chunk_summaries=group,
+                model=model,
+                style=style,
+                title=title,
+            )
+
+    while len(summaries) > COMBINE_GROUP_SIZE:
+        groups = [
+            summaries[i:i + COMBINE_GROUP_SIZE]
+            for i in range(0, len(summaries), COMBINE_GROUP_SIZE)
+        ]
+        print(f"    [{title}] Combining {len(summaries)} summaries in {len(groups)} group(s)...")
+        summaries = await asyncio.gather(*[one(group) for group in groups])
+
+    return summaries
+
+
+def load_checkpoints(
+    checkpoint_dir: Path,
+    chunks: List[str],
+    model: str,
+    style: str,
+) -> List[Optional[str]]:
+    """
+    Load chunk summaries saved by an earlier run that crashed part-way.
+    Returns one entry per chunk, None where there is no checkpoint yet.
+    Checkpoints written for different chunks, model or style are thrown away.
+    """
+    fingerprint = hashlib.sha256(
+        json.dumps({"model": model, "style": style, "chunks": chunks}).encode("utf-8")
+    ).hexdigest()
+    marker = checkpoint_dir / "fingerprint"
+    if checkpoint_dir.exists() and (
+        not marker.exists() or marker.read_text(encoding="utf-8") != fingerprint
+    ):
+        shutil.rmtree(checkpoint_dir)
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    marker.write_text(fingerprint, encoding="utf-8")
+
+    summaries: List[Optional[str]] = []
+    for idx in range(len(chunks)):
+        path = checkpoint_dir / f"chunk_{idx:04d}.txt"
+        summaries.append(path.read_text(encoding="utf-8") if path.exists() else None)
+    return summaries
+
+
+def save_checkpoint(checkpoint_dir: Path, idx: int, summary: str) -> None:
+    """
+    Write one chunk summary to its checkpoint file (write then rename, so it's never half-written).
+    """
+    path = checkpoint_dir / f"chunk_{idx:04d}.txt"
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(summary, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+async def summarize_chunks_async(
+    client: AsyncOpenAI,
+    chunks: List[str],
+    chunk_model: str,
+    combine_model: str,
+    style: str,
+    title: str,
+    sem: asyncio.Semaphore,
+    chunks_per_batch: int = 6,
+    checkpoint_dir: Optional[Path] = None,
+) -> List[str]:
+    """
+    Summarize all chunks in parallel batches of chunks_per_batch, each request
+    holding sem, then tree-combine the chunk summaries down to the few that go
+    into the final combine.
+
+    With checkpoint_dir, every chunk summary is saved as soon as it arrives and
+    chunks that already have a checkpoint are not sent again.
+    """
+    if checkpoint_dir is not None:
+        chunk_summaries = load_checkpoints(checkpoint_dir, chunks, chunk_model, style)
+    else:
+        chunk_summaries = [None] * len(chunks)
+
+    todo = [idx for idx, summary in enumerate(chunk_summaries) if summary is None]
+    if len(todo) < len(chunks):
+        print(f"    [{title}] Resuming: {len(chunks) - len(todo)} chunk summaries loaded from checkpoints")
+    batches = [todo[i:i + chunks_per_batch] for i in range(0, len(todo), chunks_per_batch)]
+    done = len(chunks) - len(todo)
+
+    async def summarize_alone(idx: int) -> str:
+        async with sem:
+            return await summarize_chunk_async(
+                client=client,
+                chunk=chunks[idx],
+                model=chunk_model,
+                style=style,
+            )
+
+    async def one(batch: List[int]) -> None:
+        nonlocal done
+        async with sem:
+            summaries = await summarize_chunk_batch(
+                client=client,
+                chunks=[chunks[idx] for idx in batch],
+                model=chunk_model,
+                style=style,
+            )
+        # chunks the batch reply left out are sent one by one, after the batch's slot
+        # is released, so each of them waits for a slot of its own
+        missing = [pos for pos, summary in enumerate(summaries) if summary is None]
+        fallbacks = await asyncio.gather(*[summarize_alone(batch[pos]) for pos in missing])
+        for pos, summary in zip(missing, fallbacks):
+            summaries[pos] = summary
+        for idx, summary in zip(batch, summaries):
+            chunk_summaries[idx] = summary
+            if checkpoint_dir is not None:
+                save_checkpoint(checkpoint_dir, idx, summary)
+        done += len(batch)
+        print(f"    [{title}] Summarized chunk {done}/{len(chunks)}")
+
+    await asyncio.gather(*[one(batch) for batch in batches])
+    return await tree_combine(
+        client=client,
+        summaries=chunk_summaries,
+        model=combine_model,
+        style=style,
+        title=title,
+        sem=sem,
+    )
+
+
+def summarize_chunks_concurrently(
+    chunks: List[str],
+    chunk_model: str,
+    combine_model: str,
+    style: str,
+    title: str,
+    max_concurrency: int,
+    chunks_per_batch: int = 6,
+) -> List[str]:
+    """
+    Blocking wrapper around summarize_chunks_async, for callers without an event loop.
+    Runs on a fresh event loop and client, with at most max_concurrency requests in flight.
+    """
+
+    async def _run() -> List[str]:
+        async with AsyncOpenAI(max_retries=0) as client:
+            return await summarize_chunks_async(
+                client=client,
+                chunks=chunks,
+                chunk_model=chunk_model,
+                combine_model=combine_model,
+                style=style,
+                title=title,
+                sem=asyncio.Semaphore(max_concurrency),
+                chunks_per_batch=chunks_per_batch,
+            )
+
+    return asyncio.run(_run())
@@ -0,0 +1,96 @@
+import time
+import asyncio
+import threading
+
+from openai import APIConnectionError, InternalServerError, RateLimitError
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+_requests_per_minute = 500.0
+_tokens = _requests_per_minute
+_updated = time.monotonic()
+_lock = threading.Lock()
+
+
+def set_requests_per_minute(requests_per_minute: float) -> None:
+    """
+    Change the request budget shared by every OpenAI call in this process.
+    """
+    global _requests_per_minute, _tokens
+    if requests_per_minute <= 0:
+        raise ValueError("requests_per_minute must be greater than 0")
+    with _lock:
+        _requests_per_minute = float(requests_per_minute)
+        _tokens = min(_tokens, _requests_per_minute)
+
+
+def _reserve() -> float:
+    """
+    Take one token from the bucket if there is one and return 0,
+    otherwise return how many seconds to wait before trying again.
+    """
+    global _tokens, _updated
+    with _lock:
+        now = time.monotonic()
+        _tokens = min(
+            _requests_per_minute,
+            _tokens + (now - _updated) * _requests_per_minute / 60.0,
+        )
+        _updated = now
+        if _tokens >= 1:
+            _tokens -= 1
+            return 0.0
+        return (1 - _tokens) * 60.0 / _requests_per_minute
+
+
+def acquire() -> None:
+    """
+    Block until the shared token bucket allows another request.
+    """
+    while True:
+        wait = _reserve()
+        if not wait:
+            return
+        time.sleep(wait)
+
+
+async def acquire_async() -> None:
+    """
+    Async version of acquire that waits without blocking the event loop.
+    """
+    while True:
+        wait = _reserve()
+        if not wait:
+            return
+        await asyncio.sleep(wait)
+
+
+# Back off on rate limits, dropped connections and 5xx errors; give up after 5 tries.
+retry_on_transient_errors = retry(
+    wait=wait_exponential(multiplier=1, min=1, max=60),
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception_type((RateLimitError, APIConnectionError, InternalServerError)),
+    reraise=True,
+)
+
+
+@retry_on_transient_errors
+def create_chat_completion(client, **kwargs):
+    """
+    client.chat.completions.create, gated by the rate limiter and retried on transient errors.
+    """
+    acquire()
+    return client.chat.completions.create(**kwargs)
+
+
+@retry_on_transient_errors
+async def create_chat_completion_async(client, **kwargs):
+    """
+    Async version of create_chat_completion.
+    """
+    await acquire_async()
+    return await client.chat.completions.create(**kwargs)
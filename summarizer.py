@@ -1,146 +1,168 @@
+import asyncio
+import functools
+import threading
 from pathlib import Path
-from typing import List
-from openai import OpenAI
-from pypdf import PdfReader
+from typing import Iterator, Optional
+from openai import AsyncOpenAI, OpenAI
 from io import BytesIO
 
-def chunk_text(text: str, chunk_size: int = 6000, overlap: int = 500) -> List[str]:
-    if len(text) <= chunk_size:
-        return [text]
-    chunks: List[str] = []
-    start = 0
-    end = chunk_size
-    while start < len(text):
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start = end - overlap
-        end = start + chunk_size
-    return chunks
-
-def summarize_chunk(
-    client: OpenAI,
-    chunk: str,
-    model: str,
-    style: str,
-) -> str:
-    style_instruction = {
-        "default": "Use a clear, student-friendly tone.",
-        "bullet": "Focus on bullet points only.",
-        "narrative": "Write in a smooth narrative style.",
-        "executive": "Write in an executive-style summary for busy leaders.",
-    }.get(style, "Use a clear, student-friendly tone.")
-
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You are a concise assistant that summarizes educational documents. "
-                    f"{style_instruction}"
-                ),
-            },
-            {
-                "role": "user",
-                "content": (
-                    "Summarize the following part of a document in 5–8 bullet points. "
-                    "Keep it compact but capture all key ideas.\n\n"
-                    f"{chunk[:12000]}"
-                ),
-            },
-        ],
-        temperature=0.2,
-    )
-    return response.choices[0].message.content.strip()
-
-def combine_chunk_summaries(
-    client: OpenAI,
-    chunk_summaries: List[str],
-    model: str,
-    style: str,
-    title: str,
-) -> str:
-    style_instruction = {
-        "default": "Use a clear, student-friendly tone.",
-        "bullet": "Focus heavily on structured bullet points.",
-        "narrative": "Write in a smooth narrative style.",
-        "executive": "Write an executive-style summary with key risks, insights, and actions.",
-    }.get(style, "Use a clear, student-friendly tone.")
-
-    joined_summaries = "\n\n---\n\n".join(chunk_summaries)
-
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You are an assistant that turns multiple partial summaries into one clear, "
-                    "structured summary a college student can use to study."
-                ),
-            },
-            {
-                "role": "user",
-                "content": (
-                    f"Document title: {title}\n\n"
-                    "You are given partial summaries of different parts of a longer document.\n\n"
-                    "TASK:\n"
-                    "1) Read all the partial summaries.\n"
-                    "2) Produce a single, well-structured summary with this schema:\n"
-                    "   - Title\n"
-                    "   - 5–7 sentence overview\n"
-                    "   - 5–10 bullet key ideas\n"
-                    "   - Optional: 3–5 action items or next steps\n\n"
-                    f"Write in this style: {style_instruction}\n\n"
-                    "Here are the partial summaries:\n\n"
-                    f"{joined_summaries[:24000]}"
-                ),
-            },
-        ],
-        temperature=0.25,
-    )
-    return response.choices[0].message.content.strip()
+from pipeline import (
+    CHARS_PER_TOKEN,
+    chunk_text,
+    combine_chunk_summaries_async,
+    read_pdf_text_pdfium,
+    read_pdf_text_pypdf,
+    stream_combine_chunk_summaries,
+    stream_summarize_single,
+    summarize_chunks_async,
+    summarize_chunks_concurrently,
+    summarize_single_async,
+)
 
-def summarize_pdf_bytes(
+@functools.lru_cache(maxsize=1)
+def get_client() -> OpenAI:
+    return OpenAI(max_retries=0)
+
+# PDFium is not thread-safe, even across separate documents, and the app extracts
+# from several threads (concurrent uploads, Streamlit sessions)
+PDFIUM_LOCK = threading.Lock()
+
+def extract_text_pdfium(pdf_bytes: bytes) -> str:
+    with PDFIUM_LOCK:
+        return read_pdf_text_pdfium(pdf_bytes)
+
+def extract_text_pypdf(pdf_bytes: bytes) -> str:
+    return read_pdf_text_pypdf(BytesIO(pdf_bytes))
+
+def extract_text(pdf_bytes: bytes, filename: str) -> str:
+    try:
+        return extract_text_pdfium(pdf_bytes)
+    except Exception as e:
+        print(f"  [WARN] pdfium could not read {filename} ({e}), falling back to pypdf")
+        return extract_text_pypdf(pdf_bytes)
+
+def summarize_pdf_bytes_stream(
     pdf_bytes: bytes,
     filename: str,
-    model: str = "gpt-4.1-mini",
+    chunk_model: str = "gpt-4.1-nano",
+    combine_model: str = "gpt-4.1-mini",
     style: str = "default",
-    max_chars_per_chunk: int = 6000,
-) -> str:
-    client = OpenAI()
-    reader = PdfReader(BytesIO(pdf_bytes))
-    text_chunks: List[str] = []
-    for page in reader.pages:
-        text = page.extract_text() or ""
-        if text.strip():
-            text_chunks.append(text)
-    text = "\n\n".join(text_chunks)
-
-    if not text.strip():
+    max_tokens_per_chunk: int = 3000,
+    max_concurrency: int = 8,
+    chunks_per_batch: int = 6,
+) -> Iterator[str]:
+    client = get_client()
+    text = extract_text(pdf_bytes, filename)
+
+    if not text or text.isspace():
         raise ValueError("No text extracted from PDF.")
 
-    chunks = chunk_text(text, chunk_size=max_chars_per_chunk, overlap=500)
+    chunks = chunk_text(text, model=chunk_model, chunk_tokens=max_tokens_per_chunk)
 
     if len(chunks) == 1:
-        return combine_chunk_summaries(
+        yield from stream_summarize_single(
             client=client,
-            chunk_summaries=[chunks[0]],
-            model=model,
+            text=chunks[0],
+            model=combine_model,
             style=style,
             title=Path(filename).stem,
         )
+        return
+
+    final_inputs = summarize_chunks_concurrently(
+        chunks=chunks,
+        chunk_model=chunk_model,
+        combine_model=combine_model,
+        style=style,
+        title=Path(filename).stem,
+        max_concurrency=max_concurrency,
+        chunks_per_batch=chunks_per_batch,
+    )
+    yield from stream_combine_chunk_summaries(
+        client=client,
+        chunk_summaries=final_inputs,
+        model=combine_model,
+        style=style,
+        title=Path(filename).stem,
+    )
+
+def summarize_pdf_bytes(
+    pdf_bytes: bytes,
+    filename: str,
+    model: Optional[str] = None,
+    style: str = "default",
+    max_chars_per_chunk: Optional[int] = None,
+    *,
+    chunk_model: str = "gpt-4.1-nano",
+    combine_model: str = "gpt-4.1-mini",
+    max_tokens_per_chunk: int = 3000,
+    max_concurrency: int = 8,
+    chunks_per_batch: int = 6,
+) -> str:
+    # model, style and max_chars_per_chunk keep their old positions so existing positional
+    # callers still work; model sets both models, and characters are converted to tokens
+    if model is not None:
+        chunk_model = combine_model = model
+    if max_chars_per_chunk is not None:
+        max_tokens_per_chunk = max_chars_per_chunk // CHARS_PER_TOKEN
+    return "".join(
+        summarize_pdf_bytes_stream(
+            pdf_bytes=pdf_bytes,
+            filename=filename,
+            chunk_model=chunk_model,
+            combine_model=combine_model,
+            style=style,
+            max_tokens_per_chunk=max_tokens_per_chunk,
+            max_concurrency=max_concurrency,
+            chunks_per_batch=chunks_per_batch,
+        )
+    ).strip()
 
-    chunk_summaries: List[str] = []
-    for chunk in chunks:
-        summary = summarize_chunk(client=client, chunk=chunk, model=model, style=style)
-        chunk_summaries.append(summary)
+async def summarize_pdf_bytes_async(
+    client: AsyncOpenAI,
+    pdf_bytes: bytes,
+    filename: str,
+    sem: asyncio.Semaphore,
+    chunk_model: str = "gpt-4.1-nano",
+    combine_model: str = "gpt-4.1-mini",
+    style: str = "default",
+    max_tokens_per_chunk: int = 3000,
+    chunks_per_batch: int = 6,
+) -> str:
+    text = await asyncio.to_thread(extract_text, pdf_bytes, filename)
 
-    final_summary = combine_chunk_summaries(
+    if not text or text.isspace():
+        raise ValueError("No text extracted from PDF.")
+
+    chunks = await asyncio.to_thread(
+        chunk_text, text, model=chunk_model, chunk_tokens=max_tokens_per_chunk
+    )
+
+    if len(chunks) == 1:
+        async with sem:
+            return await summarize_single_async(
+                client=client,
+                text=chunks[0],
+                model=combine_model,
+                style=style,
+                title=Path(filename).stem,
+            )
+
+    final_inputs = await summarize_chunks_async(
         client=client,
-        chunk_summaries=chunk_summaries,
-        model=model,
+        chunks=chunks,
+        chunk_model=chunk_model,
+        combine_model=combine_model,
         style=style,
         title=Path(filename).stem,
+        sem=sem,
+        chunks_per_batch=chunks_per_batch,
     )
-    return final_summary
+    async with sem:
+        return await combine_chunk_summaries_async(
+            client=client,
+            chunk_summaries=final_inputs,
+            model=combine_model,
+            style=style,
+            title=Path(filename).stem,
+        )